@@ -77,123 +77,418 @@ Version: 1.0.0
 from __future__ import annotations
 
 
-import argparse
+import base64
+import email.utils
+import functools
+import gzip
+import hashlib
+import http.client
 import json
 import os
+import random
 import re
+import select
+import shutil
+import ssl
 import sys
+import threading
 import time
 import urllib.error
 import urllib.parse
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 
 try:
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', 'bookverse-infra', 'libraries', 'bookverse-devops', 'scripts'))
-    from oidc_auth import get_jfrog_token, get_apptrust_base_url
-    OIDC_AVAILABLE = True
+    import ijson
 except ImportError:
-    OIDC_AVAILABLE = False
+    ijson = None
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _json_loads = json.loads
 
 SEMVER_RE = re.compile(
-    r"^\s*v?(?P<major>0|[1-9]\d*)\.(?P<minor>0|[1-9]\d*)\.(?P<patch>0|[1-9]\d*)"
-    r"(?:-(?P<prerelease>(?:0|[1-9]\d*|[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|[a-zA-Z-][0-9a-zA-Z-]*))*))?"
-    r"(?:\+(?P<build>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?\s*$"
+    r"^\s*v?(?P<major>0|[1-9][0-9]*)\.(?P<minor>0|[1-9][0-9]*)\.(?P<patch>0|[1-9][0-9]*)"
+    r"(?:-(?P<prerelease>(?:0|[1-9][0-9]*|[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9][0-9]*|[a-zA-Z-][0-9a-zA-Z-]*))*))?"
+    r"(?:\+(?P<build>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?\s*$",
+    re.ASCII,
 )
 
-@dataclass(frozen=True)
+# Plain MAJOR.MINOR.PATCH, the shape nearly every PROD version has; no group dict, no backtracking.
+SIMPLE_RE = re.compile(r"v?(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)", re.ASCII)
+
+# Releases rank above any pre-release of the same MAJOR.MINOR.PATCH.
+_RELEASE_KEY: Tuple[Tuple[int, ...], ...] = ((2,),)
+
+def _prerelease_key(prerelease: Tuple[str, ...]) -> Tuple[Tuple[Any, ...], ...]:
+    if not prerelease:
+        return _RELEASE_KEY
+    return tuple((0, int(p)) if p.isdigit() else (1, p) for p in prerelease)
+
 class SemVer:
-    major: int
-    minor: int
-    patch: int
-    prerelease: Tuple[str, ...]
-    original: str
+    __slots__ = ("major", "minor", "patch", "prerelease", "sort_key")
+
+    def __init__(self, major: int, minor: int, patch: int, prerelease: Tuple[str, ...]) -> None:
+        self.major = major
+        self.minor = minor
+        self.patch = patch
+        self.prerelease = prerelease
+        # Built once here so ordering, equality and hashing are plain tuple operations.
+        self.sort_key = (major, minor, patch, _prerelease_key(prerelease))
 
     @staticmethod
     def parse(version: str) -> Optional["SemVer"]:
-        m = SEMVER_RE.match(version)
-        if not m:
-            return None
-        g = m.groupdict()
-        prerelease_raw = g.get("prerelease") or ""
-        return SemVer(int(g["major"]), int(g["minor"]), int(g["patch"]), tuple(prerelease_raw.split(".")) if prerelease_raw else tuple(), version)
+        return _parse_semver(version)
 
     def __lt__(self, other: "SemVer") -> bool:
-        return compare_semver(self, other) < 0
-
-def compare_semver(a: SemVer, b: SemVer) -> int:
-    if a.major != b.major:
-        return -1 if a.major < b.major else 1
-    if a.minor != b.minor:
-        return -1 if a.minor < b.minor else 1
-    if a.patch != b.patch:
-        return -1 if a.patch < b.patch else 1
-    if not a.prerelease and b.prerelease:
-        return 1
-    if a.prerelease and not b.prerelease:
-        return -1
-    for at, bt in zip(a.prerelease, b.prerelease):
-        if at == bt:
-            continue
-        a_num, b_num = at.isdigit(), bt.isdigit()
-        if a_num and b_num:
-            ai, bi = int(at), int(bt)
-            if ai != bi:
-                return -1 if ai < bi else 1
-        elif a_num and not b_num:
-            return -1
-        elif not a_num and b_num:
-            return 1
-        else:
-            if at < bt:
-                return -1
-            return 1
-    if len(a.prerelease) != len(b.prerelease):
-        return -1 if len(a.prerelease) < len(b.prerelease) else 1
-    return 0
+        return self.sort_key < other.sort_key
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SemVer):
+            return NotImplemented
+        return self.sort_key == other.sort_key
+
+    def __hash__(self) -> int:
+        return hash(self.sort_key)
+
+    def __repr__(self) -> str:
+        return f"SemVer(major={self.major}, minor={self.minor}, patch={self.patch}, prerelease={self.prerelease!r})"
+
+@functools.lru_cache(maxsize=4096)
+def _parse_semver(version: str) -> Optional[SemVer]:
+    m = SIMPLE_RE.fullmatch(version)
+    if m:
+        major, minor, patch = int(m[1]), int(m[2]), int(m[3])
+        return SemVer(major, minor, patch, ())
+    # Pre-release / build versions: one regex match with positional groups beats a Python-level scanner.
+    m = SEMVER_RE.match(version)
+    if not m:
+        return None
+    major_s, minor_s, patch_s, prerelease_raw, _ = m.groups()
+    major, minor, patch = int(major_s), int(minor_s), int(patch_s)
+    prerelease = tuple(prerelease_raw.split(".")) if prerelease_raw else ()
+    return SemVer(major, minor, patch, prerelease)
 
 def sort_versions_by_semver_desc(version_strings: List[str]) -> List[str]:
-    parsed: List[Tuple[SemVer, str]] = []
-    for v in version_strings:
-        sv = SemVer.parse(v)
-        if sv is not None:
-            parsed.append((sv, v))
-    parsed.sort(key=lambda t: t[0], reverse=True)
+    parsed = [(sv.sort_key, v) for v in version_strings if (sv := _parse_semver(v)) is not None]
+    parsed.sort(key=itemgetter(0), reverse=True)
     return [v for _, v in parsed]
 
+# One context for every connection so reconnects can resume earlier TLS sessions.
+_SSL_CTX = ssl.create_default_context()
+_SSL_CTX.set_alpn_protocols(["http/1.1"])
+
+class _ResumingHTTPSConnection(http.client.HTTPSConnection):
+    # Last TLS session seen per (host, port), offered again on the next handshake.
+    _sessions: Dict[Tuple[str, Optional[int]], ssl.SSLSession] = {}
+
+    def connect(self) -> None:
+        # HTTPConnection.connect opens the TCP socket and already sets TCP_NODELAY.
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname, session=self._sessions.get((self.host, self.port)))
+
+    def close(self) -> None:
+        sock = self.sock
+        if isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+            self._sessions[(self.host, self.port)] = sock.session
+        super().close()
+
+# Transient AppTrust responses worth retrying. GETs retry on any of them (and on
+# connection errors); PATCH/POST only when the server names a Retry-After for 429/503.
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+_NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+_MAX_RETRIES = 3
+_MAX_BACKOFF_SECONDS = 10.0
+_MAX_RETRY_AFTER_SECONDS = 60.0
+
+# Errors after which a request may be retried on a fresh connection.
+_TRANSPORT_ERRORS: Tuple[type, ...] = (OSError, http.client.HTTPException)
+if urllib3 is not None:
+    _TRANSPORT_ERRORS += (urllib3.exceptions.HTTPError,)
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+def _backoff_seconds(attempt: int) -> float:
+    return min(2 ** attempt + random.random(), _MAX_BACKOFF_SECONDS)
+
+# Every rollback this script issues is from PROD, so encode that body once.
+_PROD_ROLLBACK_BODY = _json_dumps({"from_stage": "PROD"})
+
+@functools.lru_cache(maxsize=256)
+def _qp(s: str) -> str:
+    return urllib.parse.quote(s, safe="")
+
+# Versions per listing page by default; the rollback widens to _FULL_LIST_LIMIT when the page may be cut short.
+_DEFAULT_LIST_LIMIT = 50
+_FULL_LIST_LIMIT = 1000
+_DEFAULT_LIST_ORDER_BY = "created"
+
 class AppTrustClient:
-    def __init__(self, base_url: str, token: str, timeout_seconds: int = 30) -> None:
+    _LIST_VERSIONS_QS = f"?limit={_DEFAULT_LIST_LIMIT}&order_by={_DEFAULT_LIST_ORDER_BY}&order_asc=false&properties=true"
+
+    def __init__(self, base_url: str, token: str, timeout_seconds: int = 30, cache_dir: Optional[str] = None) -> None:
         self.base_url = base_url.rstrip("/")
         self.token = token
         self.timeout_seconds = timeout_seconds
-
-    def _request(self, method: str, path: str, query: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        url = f"{self.base_url}{path}"
-        if query:
-            q = urllib.parse.urlencode({k: v for k, v in query.items() if v is not None})
-            url = f"{url}?{q}"
-        data = None
-        headers = {"Authorization": f"Bearer {self.token}", "Accept": "application/json"}
-        if body is not None:
-            data = json.dumps(body).encode("utf-8")
-            headers["Content-Type"] = "application/json"
-        req = urllib.request.Request(url=url, data=data, method=method, headers=headers)
-        with urllib.request.urlopen(req, timeout=self.timeout_seconds) as resp:
-            raw = resp.read()
-            if not raw:
-                return {}
+        self.cache_dir = cache_dir
+        parts = urllib.parse.urlsplit(self.base_url)
+        self._scheme = parts.scheme or "https"
+        self._host = parts.hostname or ""
+        self._port = parts.port
+        self._path_prefix = parts.path
+        self._origin = f"{self._scheme}://{parts.netloc}"
+        # Fixed for the client's lifetime; read-only so requests can share them without copying.
+        self._base_headers: Mapping[str, str] = MappingProxyType({"Authorization": f"Bearer {token}", "Accept": "application/json", "Accept-Encoding": "gzip"})
+        self._json_headers: Mapping[str, str] = MappingProxyType({**self._base_headers, "Content-Type": "application/json"})
+        # urllib3's pool is thread-safe and keeps sockets alive across calls; without
+        # urllib3 the client falls back to its own per-thread http.client connections.
+        self._http = None
+        if urllib3 is not None:
+            self._http = urllib3.PoolManager(num_pools=4, maxsize=8, retries=False, timeout=timeout_seconds, ssl_context=_SSL_CTX)
+        # http.client connections are not thread-safe, so each thread keeps its own.
+        self._local = threading.local()
+        self._conns: List[http.client.HTTPConnection] = []
+        self._conns_lock = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._scheme == "http":
+                conn: http.client.HTTPConnection = http.client.HTTPConnection(self._host, self._port, timeout=self.timeout_seconds)
+            else:
+                conn = _ResumingHTTPSConnection(self._host, self._port, timeout=self.timeout_seconds, context=_SSL_CTX)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        if self._http is not None:
+            self._http.clear()
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+    def _open(self, method: str, path: str, body: Optional[Union[Dict[str, Any], bytes]] = None, extra_headers: Optional[Dict[str, str]] = None) -> Any:
+        target = f"{self._path_prefix}{path}"
+        # Bodies may arrive already encoded (see _PROD_ROLLBACK_BODY).
+        data = body if body is None or isinstance(body, bytes) else _json_dumps(body)
+        headers = self._base_headers if body is None else self._json_headers
+        if extra_headers:
+            headers = {**headers, **extra_headers}
+        idempotent = method == "GET"
+        retries = 0
+        while True:
             try:
-                return json.loads(raw.decode("utf-8"))
-            except Exception:
-                return {"raw": raw.decode("utf-8", errors="replace")}
+                resp = self._send(method, target, data, headers)
+            except _TRANSPORT_ERRORS:
+                if self._http is None:
+                    self._connection().close()
+                if not idempotent or retries >= _MAX_RETRIES:
+                    raise
+                time.sleep(_backoff_seconds(retries))
+                retries += 1
+                continue
+            if resp.status in _RETRY_STATUSES and retries < _MAX_RETRIES:
+                retry_after = _retry_after_seconds(resp.headers.get("Retry-After"))
+                if idempotent or (resp.status in _NON_IDEMPOTENT_RETRY_STATUSES and retry_after is not None):
+                    resp.read()
+                    time.sleep(max(_backoff_seconds(retries), min(retry_after or 0.0, _MAX_RETRY_AFTER_SECONDS)))
+                    retries += 1
+                    continue
+            break
+        if resp.status >= 400:
+            resp.read()
+            raise urllib.error.HTTPError(f"{self.base_url}{path}", resp.status, resp.reason, resp.headers, None)
+        return resp
+
+    def _send(self, method: str, target: str, data: Optional[bytes], headers: Mapping[str, str]) -> Any:
+        if self._http is not None:
+            # Retries are handled by _open; the body is read (or streamed) by the caller.
+            return self._http.request(method, f"{self._origin}{target}", body=data, headers=headers, preload_content=False)
+        conn = self._connection()
+        if conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            # An idle kept-alive socket that is readable has been closed by the server.
+            conn.close()
+        reused = conn.sock is not None
+        try:
+            conn.request(method, target, body=data, headers=headers)
+        except (ConnectionResetError, BrokenPipeError):
+            # A kept-alive socket the server already closed fails on send, so nothing
+            # was delivered; request() reconnects after close(). Fresh sockets never replay.
+            if not reused:
+                raise
+            conn.close()
+            conn.request(method, target, body=data, headers=headers)
+            return conn.getresponse()
+        try:
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError):
+            # The request may have been processed; only a GET on a stale kept-alive socket is
+            # replayed here, anything else goes up to _open's retry rules.
+            if not reused or method != "GET":
+                raise
+            conn.close()
+            conn.request(method, target, body=data, headers=headers)
+            return conn.getresponse()
+
+    def _exchange(self, method: str, path: str, body: Optional[Union[Dict[str, Any], bytes]] = None, extra_headers: Optional[Dict[str, str]] = None) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        resp = self._open(method, path, body=body, extra_headers=extra_headers)
+        raw = resp.read()
+        if self._gzipped(resp):
+            raw = gzip.decompress(raw)
+        return resp.status, resp.headers, raw
+
+    def _gzipped(self, resp: Any) -> bool:
+        # urllib3 decodes Content-Encoding itself; http.client hands back the compressed bytes.
+        return self._http is None and resp.headers.get("Content-Encoding", "").lower() == "gzip"
+
+    @staticmethod
+    def _decode(raw: bytes) -> Dict[str, Any]:
+        if not raw:
+            return {}
+        try:
+            return _json_loads(raw)
+        except Exception:
+            return {"raw": raw.decode("utf-8", errors="replace")}
+
+    def _request_raw(self, method: str, path: str, body: Optional[Union[Dict[str, Any], bytes]] = None) -> Dict[str, Any]:
+        # `path` already carries any query string.
+        _, _, raw = self._exchange(method, path, body=body)
+        return self._decode(raw)
 
-    def list_application_versions(self, app_key: str, limit: int = 1000) -> Dict[str, Any]:
-        path = f"/applications/{urllib.parse.quote(app_key)}/versions"
-        return self._request("GET", path, query={"limit": limit, "order_by": "created", "order_asc": "false"})
+    def _versions_cache_dir(self, app_key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        # Hashed like the entry names, so keys such as "." or ".." cannot point outside the cache.
+        return os.path.join(self.cache_dir, hashlib.sha256(app_key.encode("utf-8")).hexdigest()[:16])
+
+    def _versions_cache_file(self, app_key: str, path: str) -> Optional[str]:
+        # One entry per listing variant (limit, ordering, filter) so they keep their own validators.
+        cache_dir = self._versions_cache_dir(app_key)
+        if not cache_dir:
+            return None
+        digest = hashlib.sha256(f"{self.base_url}{path}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(cache_dir, f"{digest}.json")
+
+    def _list_versions_path(self, app_key: str, limit: int, order_by: str = _DEFAULT_LIST_ORDER_BY, release_status: Optional[str] = None) -> str:
+        qs = self._LIST_VERSIONS_QS
+        if limit != _DEFAULT_LIST_LIMIT or order_by != _DEFAULT_LIST_ORDER_BY or release_status:
+            query = {"limit": limit, "order_by": order_by, "order_asc": "false", "properties": "true"}
+            if release_status:
+                query["release_status"] = release_status
+            qs = "?" + urllib.parse.urlencode(query)
+        return f"/applications/{_qp(app_key)}/versions{qs}"
+
+    def _load_versions_cache(self, cache_file: Optional[str], path: str) -> Optional[Dict[str, Any]]:
+        if not cache_file:
+            return None
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("base_url") != self.base_url or cached.get("path") != path:
+            return None
+        return cached
+
+    @staticmethod
+    def _conditional_headers(cached: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def _store_versions_cache(self, cache_file: str, path: str, headers: http.client.HTTPMessage, result: Dict[str, Any]) -> None:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump({"base_url": self.base_url, "path": path, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"), "body": result}, f)
+        except OSError:
+            pass
+
+    def _invalidate_versions_cache(self, app_key: str) -> None:
+        cache_dir = self._versions_cache_dir(app_key)
+        if cache_dir:
+            # Runs after a successful mutation; a cache problem must never surface as its failure.
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def list_application_versions(self, app_key: str, limit: int = _DEFAULT_LIST_LIMIT, order_by: str = _DEFAULT_LIST_ORDER_BY, release_status: Optional[str] = None) -> Dict[str, Any]:
+        path = self._list_versions_path(app_key, limit, order_by, release_status)
+        cache_file = self._versions_cache_file(app_key, path)
+        cached = self._load_versions_cache(cache_file, path)
+        status, headers, raw = self._exchange("GET", path, extra_headers=self._conditional_headers(cached))
+        if status == 304 and cached is not None:
+            return cached["body"]
+        result = self._decode(raw)
+        if cache_file and (headers.get("ETag") or headers.get("Last-Modified")) and "raw" not in result:
+            self._store_versions_cache(cache_file, path, headers, result)
+        return result
+
+    def iter_application_versions(self, app_key: str, limit: int = _DEFAULT_LIST_LIMIT, order_by: str = _DEFAULT_LIST_ORDER_BY, release_status: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if ijson is None:
+            yield from self.list_application_versions(app_key, limit, order_by, release_status).get("versions", [])
+            return
+        path = self._list_versions_path(app_key, limit, order_by, release_status)
+        cache_file = self._versions_cache_file(app_key, path)
+        cached = self._load_versions_cache(cache_file, path)
+        resp = self._open("GET", path, extra_headers=self._conditional_headers(cached))
+        try:
+            if resp.status == 304 and cached is not None:
+                yield from cached["body"].get("versions", [])
+                return
+            cacheable = bool(cache_file and (resp.headers.get("ETag") or resp.headers.get("Last-Modified")))
+            kept: List[Dict[str, Any]] = []
+            stream = gzip.GzipFile(fileobj=resp) if self._gzipped(resp) else resp
+            for item in ijson.items(stream, "versions.item", use_float=True):
+                if cacheable:
+                    kept.append(item)
+                yield item
+            if cacheable:
+                self._store_versions_cache(cache_file, path, resp.headers, {"versions": kept})
+        finally:
+            # Drain whatever the parser left unread so the connection can be reused.
+            resp.read()
+
+    def get_application_version(self, app_key: str, version: str) -> Dict[str, Any]:
+        # Same properties flag as the listing, so the existing-backup check can use this response.
+        path = f"/applications/{_qp(app_key)}/versions/{_qp(version)}?properties=true"
+        return self._request_raw("GET", path)
 
     def patch_application_version(self, app_key: str, version: str, tag: Optional[str] = None, properties: Optional[Dict[str, List[str]]] = None, delete_properties: Optional[List[str]] = None) -> Dict[str, Any]:
-        path = f"/applications/{urllib.parse.quote(app_key)}/versions/{urllib.parse.quote(version)}"
+        path = f"/applications/{_qp(app_key)}/versions/{_qp(version)}"
         body: Dict[str, Any] = {}
         if tag is not None:
             body["tag"] = tag
@@ -201,13 +496,17 @@ class AppTrustClient:
             body["properties"] = properties
         if delete_properties is not None:
             body["delete_properties"] = delete_properties
-        return self._request("PATCH", path, body=body)
+        result = self._request_raw("PATCH", path, body=body)
+        self._invalidate_versions_cache(app_key)
+        return result
 
     def rollback_application_version(self, app_key: str, version: str, from_stage: str = "PROD") -> Dict[str, Any]:
         
-        path = f"/applications/{urllib.parse.quote(app_key)}/versions/{urllib.parse.quote(version)}/rollback"
-        body = {"from_stage": from_stage}
-        return self._request("POST", path, body=body)
+        path = f"/applications/{_qp(app_key)}/versions/{_qp(version)}/rollback"
+        body = _PROD_ROLLBACK_BODY if from_stage == "PROD" else {"from_stage": from_stage}
+        result = self._request_raw("POST", path, body=body)
+        self._invalidate_versions_cache(app_key)
+        return result
 
 TRUSTED = "TRUSTED_RELEASE"
 RELEASED = "RELEASED"
@@ -216,63 +515,102 @@ LATEST_TAG = "latest"
 BACKUP_BEFORE_LATEST = "original_tag_before_latest"
 BACKUP_BEFORE_QUARANTINE = "original_tag_before_quarantine"
 
-def get_prod_versions(client: AppTrustClient, app_key: str) -> List[Dict[str, Any]]:
-    resp = client.list_application_versions(app_key)
-    versions = resp.get("versions", [])
-    norm: List[Dict[str, Any]] = []
-    for v in versions:
-        ver = str(v.get("version", ""))
-        tag = v.get("tag")
-        tag_str = "" if tag is None else str(tag)
-        rs = str(v.get("release_status", "")).upper()
-        if rs in (TRUSTED, RELEASED):
-            norm.append({"version": ver, "tag": tag_str, "release_status": rs})
-    order = sort_versions_by_semver_desc([v["version"] for v in norm])
-    idx = {ver: i for i, ver in enumerate(order)}
-    norm.sort(key=lambda x: idx.get(x["version"], 10**9))
-    return norm
+def _prod_entry(v: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    rs = str(v.get("release_status", "")).upper()
+    if rs not in (TRUSTED, RELEASED):
+        return None
+    tag = v.get("tag")
+    tag_str = "" if tag is None else str(tag)
+    return {"version": str(v.get("version", "")), "tag": tag_str, "release_status": rs, "properties": v.get("properties") or {}}
+
+def get_prod_versions(client: AppTrustClient, app_key: str, server_order_by: Optional[str] = None, limit: int = _DEFAULT_LIST_LIMIT) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], int]:
+    # Also returns how many raw items the listing held, so callers can tell a full (possibly cut) page.
+    listed = 0
+    parsed: List[Tuple[Tuple[Any, ...], Dict[str, Any]]] = []
+    unparsed: List[Dict[str, Any]] = []
+    by_version: Dict[str, Dict[str, Any]] = {}
+    if server_order_by:
+        # The server filters and orders newest-first by SemVer; keep its order and skip the parse+sort.
+        ordered: List[Dict[str, Any]] = []
+        for v in client.iter_application_versions(app_key, limit, order_by=server_order_by, release_status=f"{TRUSTED},{RELEASED}"):
+            listed += 1
+            entry = _prod_entry(v)
+            if entry is not None:
+                by_version[entry["version"]] = entry
+                ordered.append(entry)
+        return ordered, by_version, listed
+    for v in client.iter_application_versions(app_key, limit):
+        listed += 1
+        entry = _prod_entry(v)
+        if entry is None:
+            continue
+        ver = entry["version"]
+        by_version[ver] = entry
+        sv = _parse_semver(ver)
+        if sv is None:
+            unparsed.append(entry)
+        else:
+            parsed.append((sv.sort_key, entry))
+    parsed.sort(key=itemgetter(0), reverse=True)
+    return [d for _, d in parsed] + unparsed, by_version, listed
+
+def get_prod_version(client: AppTrustClient, app_key: str, version: str) -> Optional[Dict[str, Any]]:
+    # None whenever the single-version lookup cannot stand in for the listing
+    # (lookup failed, not a PROD release, or no properties to check for a backup).
+    try:
+        v = client.get_application_version(app_key, version)
+    except urllib.error.HTTPError:
+        return None
+    if "properties" not in v:
+        return None
+    return _prod_entry(v)
 
 def pick_next_latest(sorted_prod_versions: List[Dict[str, Any]], exclude_version: str) -> Optional[Dict[str, Any]]:
-    dup: Dict[str, List[Dict[str, Any]]] = {}
+    # Highest eligible version wins; among entries sharing that version string prefer TRUSTED.
+    first: Optional[Dict[str, Any]] = None
     for v in sorted_prod_versions:
-        if v["version"] == exclude_version:
+        if v["version"] == exclude_version or v.get("tag", "") == QUARANTINE_TAG:
             continue
-        if v.get("tag", "") == QUARANTINE_TAG:
+        if first is None:
+            first = v
+        elif v["version"] != first["version"]:
             continue
-        dup.setdefault(v["version"], []).append(v)
-    if not dup:
-        return None
-    seen: set[str] = set()
-    ordered: List[str] = []
-    for v in sorted_prod_versions:
-        vv = v["version"]
-        if vv == exclude_version:
-            continue
-        if vv in dup and vv not in seen:
-            ordered.append(vv)
-            seen.add(vv)
-    for ver in ordered:
-        cands = dup[ver]
-        trusted = [c for c in cands if c.get("release_status") == TRUSTED]
-        if trusted:
-            return trusted[0]
-        return cands[0]
-    return None
+        if v.get("release_status") == TRUSTED:
+            return v
+    return first
 
-def backup_tag_then_patch(client: AppTrustClient, app_key: str, version: str, backup_prop_key: str, new_tag: str, current_tag: str, dry_run: bool) -> None:
-    props = {backup_prop_key: [current_tag]}
+def backup_tag_then_patch(client: AppTrustClient, app_key: str, version: str, backup_prop_key: str, new_tag: str, current_tag: str, dry_run: bool, keep_existing_backup: bool = False) -> None:
+    # An existing backup records the tag from before an earlier run; never overwrite it.
+    props = None if keep_existing_backup else {backup_prop_key: [current_tag]}
     if dry_run:
         print(f"[DRY-RUN] PATCH backup+tag: app={app_key} version={version} props={props} tag={new_tag}")
         return
     client.patch_application_version(app_key, version, tag=new_tag, properties=props)
 
-def rollback_in_prod(client: AppTrustClient, app_key: str, target_version: str, dry_run: bool = False) -> None:
-    prod_versions = get_prod_versions(client, app_key)
-    by_version = {v["version"]: v for v in prod_versions}
-    target = by_version.get(target_version)
+def rollback_in_prod(client: AppTrustClient, app_key: str, target_version: str, dry_run: bool = False, server_order_by: Optional[str] = None) -> None:
+    # The full PROD listing is only needed to pick a successor when the target holds latest.
+    prod_versions: List[Dict[str, Any]] = []
+    target = get_prod_version(client, app_key, target_version)
+    if target is None or target.get("tag", "") == LATEST_TAG:
+        # In creation order any page short of the full listing can miss an older but higher version,
+        # so only a SemVer-ordered listing starts with the small page.
+        limit = _DEFAULT_LIST_LIMIT if server_order_by else _FULL_LIST_LIMIT
+        prod_versions, by_version, listed = get_prod_versions(client, app_key, server_order_by, limit)
+        target = by_version.get(target_version, target)
+        # A page under the limit holds every version; a full one must hold the target and a successor.
+        if limit < _FULL_LIST_LIMIT and listed >= limit:
+            needs_successor = target is not None and target.get("tag", "") == LATEST_TAG
+            if target is None or (needs_successor and pick_next_latest(prod_versions, exclude_version=target_version) is None):
+                prod_versions, by_version, _ = get_prod_versions(client, app_key, server_order_by, limit=_FULL_LIST_LIMIT)
+                target = by_version.get(target_version)
     if target is None:
         raise RuntimeError(f"Target version not found in PROD set: {target_version}")
 
+    current_tag = target.get("tag", "")
+    if current_tag == QUARANTINE_TAG:
+        print(f"{app_key}@{target_version} is already quarantined; skipping rollback.")
+        return
+
     from_stage = "PROD"
     if not dry_run:
         print(f"Calling AppTrust endpoint: POST /applications/{app_key}/versions/{target_version}/rollback with body {{from_stage: {from_stage}}}")
@@ -284,22 +622,39 @@ def rollback_in_prod(client: AppTrustClient, app_key: str, target_version: str,
     else:
         print(f"[DRY-RUN] Would call AppTrust rollback API: POST /applications/{app_key}/versions/{target_version}/rollback with body {{from_stage: {from_stage}}}")
 
-    current_tag = target.get("tag", "")
     had_latest = current_tag == LATEST_TAG
+    has_backup = BACKUP_BEFORE_QUARANTINE in target.get("properties", {})
+    next_candidate = pick_next_latest(prod_versions, exclude_version=target_version) if had_latest else None
 
-    backup_tag_then_patch(client, app_key, target_version, BACKUP_BEFORE_QUARANTINE, QUARANTINE_TAG, current_tag, dry_run)
-
-    if had_latest:
-        next_candidate = pick_next_latest(prod_versions, exclude_version=target_version)
-        if next_candidate is None:
-            print("No successor found for latest; system will have no 'latest' until next promote.")
-            return
+    # The quarantine PATCH stays on this thread so it reuses the kept-alive connection; only the
+    # successor PATCH, which touches a different version, goes to a worker to overlap with it.
+    if next_candidate is None:
+        backup_tag_then_patch(client, app_key, target_version, BACKUP_BEFORE_QUARANTINE, QUARANTINE_TAG, current_tag, dry_run, has_backup)
+    else:
         cand_ver = next_candidate["version"]
         cand_tag = next_candidate.get("tag", "")
-        backup_tag_then_patch(client, app_key, cand_ver, BACKUP_BEFORE_LATEST, LATEST_TAG, cand_tag, dry_run)
-        print(f"Reassigned latest to {cand_ver}")
-    else:
+        quarantine_error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            successor = ex.submit(backup_tag_then_patch, client, app_key, cand_ver, BACKUP_BEFORE_LATEST, LATEST_TAG, cand_tag, dry_run)
+            try:
+                backup_tag_then_patch(client, app_key, target_version, BACKUP_BEFORE_QUARANTINE, QUARANTINE_TAG, current_tag, dry_run, has_backup)
+            except Exception as e:
+                quarantine_error = e
+            # Always collect the successor PATCH so its failure is never lost behind the quarantine one.
+            successor_error = successor.exception()
+        if quarantine_error is not None and successor_error is not None:
+            raise RuntimeError(f"Quarantine PATCH failed: {quarantine_error}; latest reassignment PATCH failed: {successor_error}") from quarantine_error
+        if quarantine_error is not None:
+            raise quarantine_error
+        if successor_error is not None:
+            raise successor_error
+
+    if not had_latest:
         print("Rolled back non-latest version; 'latest' unchanged.")
+    elif next_candidate is None:
+        print("No successor found for latest; system will have no 'latest' until next promote.")
+    else:
+        print(f"Reassigned latest to {next_candidate['version']}")
 
 def _env(name: str, default: Optional[str] = None) -> Optional[str]:
     v = os.environ.get(name)
@@ -307,34 +662,104 @@ def _env(name: str, default: Optional[str] = None) -> Optional[str]:
         return default
     return v.strip()
 
+@functools.lru_cache(maxsize=None)
+def _oidc_auth() -> Optional[Any]:
+    # Imported on first use so runs with an explicit --token/--base-url skip it.
+    try:
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', 'bookverse-infra', 'libraries', 'bookverse-devops', 'scripts'))
+        import oidc_auth
+        return oidc_auth
+    except ImportError:
+        return None
+
+_TOKEN_CACHE: Dict[str, Any] = {"token": None, "expires_at": 0.0}
+# Refresh this long before the token actually expires.
+_TOKEN_REFRESH_MARGIN_SECONDS = 30
+# Used when an OIDC token carries no readable exp claim.
+_OIDC_TOKEN_DEFAULT_TTL_SECONDS = 120
+# Tokens from JF_OIDC_TOKEN are minted by an earlier workflow step; assume a short life.
+_ENV_TOKEN_TTL_SECONDS = 240
+
+def _jwt_exp(token: str) -> Optional[float]:
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, AttributeError, TypeError):
+        return None
+
+def _cache_token(token: str, expires_at: float) -> str:
+    _TOKEN_CACHE["token"] = token
+    _TOKEN_CACHE["expires_at"] = expires_at
+    return token
+
 def get_auth_token() -> Optional[str]:
-    if OIDC_AVAILABLE:
-        token = get_jfrog_token()
+    now = time.time()
+    if _TOKEN_CACHE["token"] and now < _TOKEN_CACHE["expires_at"] - _TOKEN_REFRESH_MARGIN_SECONDS:
+        return _TOKEN_CACHE["token"]
+
+    oidc_auth = _oidc_auth()
+    if oidc_auth is not None:
+        token = oidc_auth.get_jfrog_token()
         if token:
-            return token
+            return _cache_token(token, _jwt_exp(token) or now + _OIDC_TOKEN_DEFAULT_TTL_SECONDS)
     
     token = _env("JF_OIDC_TOKEN")
     if token:
-        return token
+        return _cache_token(token, now + _ENV_TOKEN_TTL_SECONDS)
     
     return None
 
+def get_cache_dir() -> Optional[str]:
+    cache_dir = _env("APPTRUST_CACHE_DIR")
+    if cache_dir:
+        return cache_dir
+    workspace = _env("GITHUB_WORKSPACE")
+    if workspace:
+        return os.path.join(workspace, ".apptrust_cache")
+    return None
+
 def get_base_url() -> Optional[str]:
-    if OIDC_AVAILABLE:
-        url = get_apptrust_base_url()
+    oidc_auth = _oidc_auth()
+    if oidc_auth is not None:
+        url = oidc_auth.get_apptrust_base_url()
         if url:
             return url
     
     return _env("APPTRUST_BASE_URL")
 
-def main() -> int:
+@dataclass
+class Args:
+    app: Optional[str]
+    version: Optional[str]
+    base_url: Optional[str] = None
+    token: Optional[str] = None
+    dry_run: bool = False
+
+def parse_args(argv: List[str]) -> Args:
+    if not argv:
+        # Env-only invocation (APPTRUST_APP / APPTRUST_VERSION / APPTRUST_DRY_RUN) skips argparse entirely.
+        return Args(
+            app=_env("APPTRUST_APP"),
+            version=_env("APPTRUST_VERSION"),
+            dry_run=(_env("APPTRUST_DRY_RUN", "") or "").lower() in ("1", "true", "yes"),
+        )
+    import argparse
     parser = argparse.ArgumentParser(description="AppTrust PROD rollback utility")
-    parser.add_argument("--app", required=True, help="Application key")
-    parser.add_argument("--version", required=True, help="Target version to rollback (SemVer)")
+    parser.add_argument("--app", required=True, help="Application key (env: APPTRUST_APP when run without arguments)")
+    parser.add_argument("--version", required=True, help="Target version to rollback (SemVer) (env: APPTRUST_VERSION when run without arguments)")
     parser.add_argument("--base-url", default=None, help="Base API URL, e.g. https://<host>/apptrust/api/v1 (env: APPTRUST_BASE_URL, JF_OIDC_TOKEN via OIDC)")
     parser.add_argument("--token", default=None, help="Access token (env: JF_OIDC_TOKEN or OIDC auto-detection)")
-    parser.add_argument("--dry-run", action="store_true", help="Log intended changes without mutating")
-    args = parser.parse_args()
+    parser.add_argument("--dry-run", action="store_true", help="Log intended changes without mutating (env: APPTRUST_DRY_RUN when run without arguments)")
+    ns = parser.parse_args(argv)
+    return Args(app=ns.app, version=ns.version, base_url=ns.base_url, token=ns.token, dry_run=ns.dry_run)
+
+def main() -> int:
+    args = parse_args(sys.argv[1:])
+    if not args.app or not args.version:
+        print("Missing APPTRUST_APP or APPTRUST_VERSION environment variable (or pass --app/--version)", file=sys.stderr)
+        return 2
 
     base_url = args.base_url or get_base_url()
     if not base_url:
@@ -346,21 +771,23 @@ def main() -> int:
     if not token:
         print("Missing authentication token", file=sys.stderr)
         print("Tried: JF_OIDC_TOKEN, OIDC auto-detection", file=sys.stderr)
-        if not OIDC_AVAILABLE:
+        if _oidc_auth() is None:
             print("Note: OIDC authentication library not available", file=sys.stderr)
         return 2
 
-    client = AppTrustClient(base_url, token)
+    client = AppTrustClient(base_url, token, cache_dir=get_cache_dir())
 
     try:
         start = time.time()
-        rollback_in_prod(client, args.app, args.version, dry_run=args.dry_run)
+        rollback_in_prod(client, args.app, args.version, dry_run=args.dry_run, server_order_by=_env("APPTRUST_SERVER_ORDER_BY"))
         elapsed = time.time() - start
         print(f"Done in {elapsed:.2f}s")
         return 0
     except Exception as e:
         print(f"ERROR: {e}", file=sys.stderr)
         return 1
+    finally:
+        client.close()
 
 if __name__ == "__main__":
     raise SystemExit(main())